@@ -3,14 +3,19 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import functools
+import itertools
+import json
 from collections import Counter
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
-from .jamf_client import JamfClient
-from .gemini_advisor import GeminiEndpointAdvisor
-from .config import load_config
+from .jamf_client import DevicePosture, JamfClient
+from .gemini_advisor import DEFAULT_CACHE_TTL, GeminiEndpointAdvisor
+from .config import DEFAULT_CONFIG, load_config
 
 
+@functools.lru_cache(maxsize=512)
 def _parse_version(version: str) -> float:
     parts = version.split(".")
     if not parts:
@@ -21,76 +26,107 @@ def _parse_version(version: str) -> float:
     return float(f"{parts[0]}.{parts[1]}")
 
 
-def _is_version_compliant(
-    os_version: str,
-    min_version: str,
-    fv_enabled: bool,
-    fw_enabled: bool,
+def _version_value(os_version: str) -> float:
+    """Parse a device OS version; versions we can't parse sort below any."""
+    try:
+        return _parse_version(os_version)
+    except Exception:
+        return float("-inf")
+
+
+def _make_compliance_checker(
+    min_version: float,
     require_fv: bool,
     require_fw: bool,
-) -> bool:
-    """Very simple version and control compliance check.
-
-    For this prototype we only care that the device is:
-    - on or above `min_version`
-    - has FileVault enabled if required
-    - has firewall enabled if required
+) -> Callable[[float, bool, bool], bool]:
+    """Return a very simple compliance check specialized to this policy.
+
+    The returned `check(version, fv_enabled, fw_enabled)` is true when the
+    device is on or above `min_version` and has FileVault / firewall enabled
+    if required. The requirements are fixed for a whole snapshot, so each
+    variant simply leaves out the controls that aren't required instead of
+    testing the flags for every posture.
     """
-    try:
-        version_ok = _parse_version(os_version) >= _parse_version(min_version)
-    except Exception:
-        version_ok = False
+    if require_fv and require_fw:
+        return lambda version, fv, fw: fv and fw and version >= min_version
+    if require_fv:
+        return lambda version, fv, fw: fv and version >= min_version
+    if require_fw:
+        return lambda version, fv, fw: fw and version >= min_version
+    return lambda version, fv, fw: version >= min_version
 
-    fv_ok = (not require_fv) or fv_enabled
-    fw_ok = (not require_fw) or fw_enabled
-    return version_ok and fv_ok and fw_ok
+
+def _posture_version(item: Tuple[DevicePosture, int]) -> str:
+    return item[0][0]
 
 
 def build_fleet_snapshot(
-    devices: List[Dict[str, Any]],
+    postures: Iterable[DevicePosture],
     config: Dict[str, Any],
 ) -> Dict[str, Any]:
-    """Build a compact snapshot of fleet posture from Jamf devices."""
-    os_counts: Counter[str] = Counter()
+    """Build a compact snapshot of fleet posture from Jamf device postures.
+
+    `postures` are `(os_version, fileVaultEnabled, firewallEnabled)` tuples
+    as returned by `JamfClient.get_device_postures`.
+    """
+    min_macos = config.get("min_macos_version", DEFAULT_CONFIG["min_macos_version"])
+    require_fv = bool(config.get("require_filevault", True))
+    require_fw = bool(config.get("require_firewall", True))
+
+    try:
+        min_ver_f = _parse_version(min_macos)
+    except (AttributeError, ValueError):
+        # An unparseable minimum fails every device, as it always has.
+        min_ver_f = float("inf")
+
+    # The control gates are fixed for the whole run, so fold them into
+    # constants: a control that isn't required always counts as passing.
+    fv_waived = not require_fv
+    fw_waived = not require_fw
+    is_compliant = _make_compliance_checker(min_ver_f, require_fv, require_fw)
+
+    # Plain dict: only a handful of distinct OS versions per fleet.
+    os_counts: Dict[str, int] = {}
+    total = 0
     fv_disabled = 0
     firewall_disabled = 0
     noncompliant = 0
 
-    min_macos = config.get("min_macos_version", "14.0")
-    require_fv = bool(config.get("require_filevault", True))
-    require_fw = bool(config.get("require_firewall", True))
+    # Collapse identical (version, FileVault, firewall) postures first.
+    # Counter does this in C, and even large fleets reduce to a few dozen
+    # distinct postures, so the Python-level logic below runs once per
+    # posture rather than once per device.
+    posture_counts: Counter[DevicePosture] = Counter(postures)
+
+    # Sorting the (few) distinct postures by version turns each OS version
+    # into one contiguous run: its breakdown entry is written once and its
+    # version string is parsed once for the whole run.
+    by_version = sorted(posture_counts.items(), key=_posture_version)
+
+    for os_version, run in itertools.groupby(by_version, key=_posture_version):
+        # Devices reporting no OS version are left out of the compliance
+        # count.
+        counted = os_version != "unknown"
+        version = _version_value(os_version) if counted else 0.0
+        version_total = 0
+
+        for (_, fv_enabled, fw_enabled), count in run:
+            version_total += count
+            if not (fv_enabled or fv_waived):
+                fv_disabled += count
+            if not (fw_enabled or fw_waived):
+                firewall_disabled += count
+            if counted and not is_compliant(version, fv_enabled, fw_enabled):
+                noncompliant += count
+
+        os_counts[os_version] = version_total
+        total += version_total
 
-    for d in devices:
-        os_info = d.get("operatingSystem", {}) or {}
-        os_version = os_info.get("version", "unknown") or "unknown"
-        os_counts[os_version] += 1
-
-        security = d.get("security", {}) or {}
-        fv_enabled = bool(security.get("fileVaultEnabled", False))
-        fw_enabled = bool(security.get("firewallEnabled", False))
-
-        if require_fv and not fv_enabled:
-            fv_disabled += 1
-        if require_fw and not fw_enabled:
-            firewall_disabled += 1
-
-        if os_version != "unknown":
-            if not _is_version_compliant(
-                os_version=os_version,
-                min_version=min_macos,
-                fv_enabled=fv_enabled,
-                fw_enabled=fw_enabled,
-                require_fv=require_fv,
-                require_fw=require_fw,
-            ):
-                noncompliant += 1
-
-    total = len(devices)
     pct_noncompliant = (noncompliant / total * 100) if total > 0 else 0.0
 
     snapshot: Dict[str, Any] = {
         "total_devices": total,
-        "os_version_breakdown": dict(os_counts),
+        "os_version_breakdown": os_counts,
         "filevault_disabled_count": fv_disabled,
         "firewall_disabled_count": firewall_disabled,
         "noncompliant_count": noncompliant,
@@ -104,6 +140,21 @@ def build_fleet_snapshot(
     return snapshot
 
 
+def _load_snapshots(path: str) -> List[Dict[str, Any]]:
+    """Read one fleet snapshot JSON object per line, skipping blank lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _print_advice(advice: Dict[str, str]) -> None:
+    print("=== Endpoint Posture Summary ===\n")
+    print(advice.get("summary", "").strip())
+    print("\n=== Remediation Plan ===\n")
+    print(advice.get("remediation_plan", "").strip())
+    print("\n=== Slack Message ===\n")
+    print(advice.get("slack_message", "").strip())
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Gemini-powered Jamf endpoint posture advisor",
@@ -114,33 +165,84 @@ def main() -> None:
         default=100,
         help="Maximum number of devices to fetch from Jamf",
     )
+    parser.add_argument(
+        "--include-unmanaged",
+        action="store_true",
+        help="Also include computers that are not under Jamf MDM management",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Fetch Jamf inventory over HTTP/2 with httpx (needs the http2 extra)",
+    )
     parser.add_argument(
         "--config",
         type=str,
         default=None,
-        help="Path to YAML config file (optional)",
+        help="Path to YAML or TOML config file (optional)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call Gemini instead of reusing a cached answer",
+    )
+    parser.add_argument(
+        "--context-cache-ttl",
+        type=str,
+        default=None,
+        help=(
+            "Keep the static prompt preamble in a Gemini context cache with "
+            "this TTL (e.g. 3600s); off by default"
+        ),
+    )
+    parser.add_argument(
+        "--batch-inputs",
+        type=str,
+        default=None,
+        help=(
+            "JSONL file of prebuilt fleet snapshots (one per line) to analyze "
+            "in a single Gemini Batch API job instead of querying Jamf"
+        ),
     )
 
     args = parser.parse_args()
 
+    advisor = GeminiEndpointAdvisor(
+        cache_ttl=0 if args.no_cache else DEFAULT_CACHE_TTL,
+        context_cache_ttl=args.context_cache_ttl,
+    )
+
+    if args.batch_inputs:
+        snapshots = _load_snapshots(args.batch_inputs)
+        for i, advice in enumerate(advisor.analyze_fleets(snapshots), start=1):
+            if i > 1:
+                print()
+            print(f"##### Snapshot {i} of {len(snapshots)} #####\n")
+            _print_advice(advice)
+        return
+
     config = load_config(args.config)
     jamf = JamfClient()
-    advisor = GeminiEndpointAdvisor()
 
-    devices = jamf.get_computers_inventory(max_devices=args.max_devices)
-    if not devices:
+    if args.http2:
+        postures = asyncio.run(
+            jamf.get_device_postures_async(
+                max_devices=args.max_devices,
+                managed_only=not args.include_unmanaged,
+            )
+        )
+    else:
+        postures = jamf.get_device_postures(
+            max_devices=args.max_devices,
+            managed_only=not args.include_unmanaged,
+        )
+    if not postures:
         print("No devices returned from Jamf Pro.")
         return
 
-    snapshot = build_fleet_snapshot(devices, config)
+    snapshot = build_fleet_snapshot(postures, config)
     advice = advisor.analyze_fleet(snapshot)
-
-    print("=== Endpoint Posture Summary ===\n")
-    print(advice.get("summary", "").strip())
-    print("\n=== Remediation Plan ===\n")
-    print(advice.get("remediation_plan", "").strip())
-    print("\n=== Slack Message ===\n")
-    print(advice.get("slack_message", "").strip())
+    _print_advice(advice)
 
 
 if __name__ == "__main__":
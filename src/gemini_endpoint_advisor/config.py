@@ -2,11 +2,26 @@
 
 from __future__ import annotations
 
+import copy
+import functools
+import mmap
 import os
+import stat
 from typing import Any, Dict, Optional
 
 import yaml
 
+try:
+    # libyaml binding; much faster than the pure-Python loader.
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader  # type: ignore[assignment]
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None  # type: ignore[assignment]
+
 
 DEFAULT_CONFIG: Dict[str, Any] = {
     "min_macos_version": "14.0",
@@ -22,29 +37,85 @@ DEFAULT_CONFIG: Dict[str, Any] = {
 }
 
 
+def _read_config_file(path: str, is_toml: bool) -> Dict[str, Any]:
+    if is_toml:
+        if tomllib is None:
+            raise RuntimeError("TOML config files require Python 3.11+")
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+            # Pipes, FIFOs and process substitution report size 0 and can't
+            # be mapped (nor can empty files); read them as a stream.
+            return yaml.load(f, Loader=_Loader) or {}
+        # Map the file and let the loader read from the mapping, rather than
+        # going through a buffered text stream.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            populate = getattr(mmap, "MADV_POPULATE_READ", None)
+            if populate is not None:
+                try:
+                    # Fault the pages in up front instead of mid-parse.
+                    mm.madvise(populate)
+                except OSError:
+                    pass  # kernel too old; the hint is optional
+            return yaml.load(mm, Loader=_Loader) or {}
+
+
+@functools.lru_cache(maxsize=16)
+def _load_merged(
+    path: str,
+    mtime_ns: int,
+    size: int,
+    is_toml: bool,
+) -> Dict[str, Any]:
+    """Parse a config file and merge it over the defaults.
+
+    Cached on (resolved path, mtime_ns, size) so edits are picked up, even
+    two within one coarse mtime tick; callers must copy the result before
+    handing it out.
+    """
+    # Deep copy so merging nested sections never writes into DEFAULT_CONFIG.
+    merged: Dict[str, Any] = copy.deepcopy(DEFAULT_CONFIG)
+    for key, value in _read_config_file(path, is_toml).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(value)  # shallow merge
+        else:
+            merged[key] = value
+    return merged
+
+
 def load_config(path: Optional[str] = None) -> Dict[str, Any]:
-    """Load YAML config from disk or return defaults.
+    """Load YAML (or TOML, by `.toml` extension) config or return defaults.
 
     Resolution order:
     1. Explicit `path` argument (if provided)
     2. GEMINI_ENDPOINT_ADVISOR_CONFIG environment variable
     3. Built-in DEFAULT_CONFIG
+
+    The result is always a fresh copy that callers may modify freely.
     """
     config_path = path or os.environ.get("GEMINI_ENDPOINT_ADVISOR_CONFIG")
     if not config_path:
-        return DEFAULT_CONFIG.copy()
+        return copy.deepcopy(DEFAULT_CONFIG)
 
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Config file not found: {config_path}")
 
-    with open(config_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-
-    merged: Dict[str, Any] = DEFAULT_CONFIG.copy()
-    for key, value in data.items():
-        if isinstance(value, dict) and isinstance(merged.get(key), dict):
-            merged[key].update(value)  # shallow merge
-        else:
-            merged[key] = value
+    is_toml = config_path.endswith(".toml")
+    st = os.stat(config_path)
+    if not stat.S_ISREG(st.st_mode):
+        # A pipe's contents can change under the same path and mtime, so
+        # don't let the parse cache remember it.
+        return _load_merged.__wrapped__(
+            config_path, st.st_mtime_ns, st.st_size, is_toml
+        )
 
-    return merged
+    # Resolve the path so the same relative path under another cwd (or a
+    # symlink swapped to a new target) never hits a stale entry.
+    return copy.deepcopy(
+        _load_merged(
+            os.path.realpath(config_path), st.st_mtime_ns, st.st_size, is_toml
+        )
+    )
@@ -2,34 +2,289 @@
 
 from __future__ import annotations
 
+import hashlib
+import io
 import json
-from typing import Any, Dict
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from google import genai  # type: ignore
+from google.genai import errors as genai_errors  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import ijson  # type: ignore
+except ImportError:  # optional: large answers are decoded in full instead
+    ijson = None  # type: ignore[assignment]
+
+# The only keys we read from Gemini's answer.
+_ADVICE_FIELDS = ("summary", "remediation_plan", "slack_message")
+
+# Answers at least this many characters long are stream-decoded for just
+# `_ADVICE_FIELDS`; smaller ones are cheaper to decode in one go.
+_STREAM_DECODE_THRESHOLD = 64 * 1024
+
+_DECODE_ERRORS: Tuple[Type[Exception], ...] = (json.JSONDecodeError,)
+if ijson is not None:
+    _DECODE_ERRORS += (ijson.JSONError,)
+
+
+def _dumps_pretty(obj: Any) -> str:
+    """Indented, key-sorted JSON for embedding in a prompt."""
+    if orjson is not None:
+        return orjson.dumps(
+            obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        ).decode()
+    return json.dumps(obj, indent=2, sort_keys=True)
+
+
+def _loads(raw: str) -> Any:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers
+    # only need to catch the stdlib exception.
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _loads_advice(raw: str) -> Dict[str, Any]:
+    """Decode Gemini's JSON answer, keeping only `_ADVICE_FIELDS`.
+
+    Raises one of `_DECODE_ERRORS` unless `raw` is a complete JSON object
+    containing at least one of the advice fields, so callers can't mistake
+    a truncated or off-shape answer for (cacheable) blank advice.
+    """
+    if ijson is None or len(raw) < _STREAM_DECODE_THRESHOLD:
+        parsed = _loads(raw)
+        if not isinstance(parsed, dict):
+            raise json.JSONDecodeError("Expected a JSON object", raw, 0)
+        wanted = {k: parsed[k] for k in _ADVICE_FIELDS if k in parsed}
+    else:
+        # kvitems() silently yields nothing for a non-object top level.
+        if not raw.lstrip().startswith("{"):
+            raise json.JSONDecodeError("Expected a JSON object", raw, 0)
+        # Big answers: walk the whole top-level object (so truncation or
+        # trailing garbage still raises) but keep only the fields we need.
+        wanted = {}
+        for key, value in ijson.kvitems(io.BytesIO(raw.encode("utf-8")), ""):
+            if key in _ADVICE_FIELDS:
+                wanted[key] = value
+
+    if not wanted:
+        raise json.JSONDecodeError("No advice fields in answer", raw, 0)
+    return wanted
+
+
+# Everything in the prompt except the fleet JSON. It is identical on every
+# call, so it goes in the system instruction (or a server-side context
+# cache) and only the snapshot is sent as per-request content.
+PROMPT_PREAMBLE = """You are a senior endpoint engineer and security-conscious
+client platform owner. You are reviewing a Jamf Pro-managed macOS fleet.
+
+You will be given JSON describing fleet posture.
+
+1. Write a concise plain-English summary (2–3 paragraphs) of the current fleet posture.
+2. Propose concrete remediation steps suitable for Jamf Pro:
+   - smart group logic ideas
+   - policy changes
+   - zero-touch / baseline improvements
+3. Generate a Slack-ready summary with bullets and emojis titled "Weekly Endpoint Posture Summary".
+
+Return your answer in *valid JSON* with this structure:
+
+{
+  "summary": "...",
+  "remediation_plan": "...",
+  "slack_message": "..."
+}"""
+
+# Fixed text around the fleet JSON in the per-request part of the prompt.
+_PROMPT_HEAD = "Fleet posture JSON:\n\n```json\n"
+_PROMPT_TAIL = "\n```"
+
+# Recreate the preamble's context cache this long before Gemini expires it.
+_CONTEXT_CACHE_REFRESH_MARGIN = timedelta(minutes=1)
+
+# Terminal states for a Gemini Batch API job.
+_BATCH_DONE_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+
+# How long a cached Gemini answer is reused for an identical prompt.
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+
+def _default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "gemini_endpoint_advisor")
+
+
+def _snapshot_prompt(fleet_snapshot: Dict[str, Any]) -> str:
+    """Per-fleet part of the prompt; see `PROMPT_PREAMBLE` for the rest."""
+    return _PROMPT_HEAD + _dumps_pretty(fleet_snapshot) + _PROMPT_TAIL
+
+
+def _response_text(response: Dict[str, Any]) -> str:
+    """Concatenate the text parts of a GenerateContentResponse JSON dict."""
+    candidates = response.get("candidates") or [{}]
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
 
 
 class GeminiEndpointAdvisor:
     """Wrapper around the Gemini client for endpoint posture analysis.
 
     By default this will look for the GEMINI_API_KEY environment variable.
+
+    Parsed answers are cached on disk, keyed by a hash of the model and
+    prompt, so re-running against an unchanged fleet skips the Gemini
+    round-trip for `cache_ttl` seconds. Pass `cache_ttl=0` to disable.
+
+    Set `context_cache_ttl` (e.g. "3600s") to also keep `PROMPT_PREAMBLE`
+    in a Gemini context cache, so long-lived callers analyzing many fleets
+    aren't billed for the preamble on every request. Gemini only accepts
+    caches above a minimum token count; if creation is rejected the advisor
+    quietly falls back to sending the preamble as a system instruction. The
+    cache is recreated shortly before it expires, or if Gemini reports it
+    missing. From the CLI this is `--context-cache-ttl`.
     """
 
-    def __init__(self, model: str = "gemini-2.5-flash") -> None:
+    def __init__(
+        self,
+        model: str = "gemini-2.5-flash",
+        cache_dir: Optional[str] = None,
+        cache_ttl: int = DEFAULT_CACHE_TTL,
+        context_cache_ttl: Optional[str] = None,
+    ) -> None:
         self.client = genai.Client()
         self.model = model
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.cache_ttl = cache_ttl
+        self.context_cache_ttl = context_cache_ttl
+        # None: not created yet (or expired); "": creation failed or disabled.
+        self._context_cache_name: Optional[str] = None if context_cache_ttl else ""
+        self._context_cache_expires: Optional[datetime] = None
 
-    def _call_gemini(self, prompt: str) -> str:
-        """Call Gemini with a simple text prompt and return the text.
+    # ------------------------------------------------------------------ #
+    # Response cache
+    # ------------------------------------------------------------------ #
+    def _cache_key(self, prompt: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        for part in (self.model, PROMPT_PREAMBLE, prompt):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, str]]:
+        if self.cache_ttl <= 0:
+            return None
+        path = self._cache_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.cache_ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                data = _loads(f.read())
+        except (OSError, ValueError):
+            # Missing or unreadable entries are just cache misses.
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _cache_put(self, key: str, advice: Dict[str, str]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename so concurrent runs never read a partial file.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError:
+            # Caching is best-effort; never fail the run over it.
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(advice, f)
+            os.replace(tmp_path, self._cache_path(key))
+        except OSError:
+            # Don't leave a stray temp file behind on every failed write.
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------ #
+    # Gemini
+    # ------------------------------------------------------------------ #
+    def _get_context_cache(self) -> str:
+        """Return the preamble's context-cache name, or "" if unavailable."""
+        if self._context_cache_name and self._context_cache_expires is not None:
+            now = datetime.now(timezone.utc)
+            if now >= self._context_cache_expires - _CONTEXT_CACHE_REFRESH_MARGIN:
+                self._context_cache_name = None
+
+        if self._context_cache_name is None:
+            try:
+                cache = self.client.caches.create(
+                    model=self.model,
+                    config={
+                        "system_instruction": PROMPT_PREAMBLE,
+                        "ttl": self.context_cache_ttl,
+                    },
+                )
+                self._context_cache_name = cache.name or ""
+                self._context_cache_expires = getattr(cache, "expire_time", None)
+            except genai_errors.APIError:
+                # Usually the preamble is below the model's minimum cache
+                # size; the system instruction path costs the same as before.
+                self._context_cache_name = ""
+                self._context_cache_expires = None
+        return self._context_cache_name
+
+    def _generate(self, prompt: str, cache_name: str) -> str:
+        if cache_name:
+            config: Dict[str, Any] = {"cached_content": cache_name}
+        else:
+            config = {"system_instruction": PROMPT_PREAMBLE}
 
-        Errors are allowed to propagate so the CLI can fail fast and loudly.
-        """
         response = self.client.models.generate_content(
             model=self.model,
             contents=prompt,
+            config=config,
         )
         # The google-genai client exposes .text for the combined text output.
         return getattr(response, "text", "") or ""
 
+    def _call_gemini(self, prompt: str) -> str:
+        """Send the per-fleet part of the prompt to Gemini and return the text.
+
+        The static preamble is attached via the context cache when one is
+        available, otherwise as the system instruction.
+
+        Errors are allowed to propagate so the CLI can fail fast and loudly.
+        """
+        cache_name = self._get_context_cache()
+        try:
+            return self._generate(prompt, cache_name)
+        except genai_errors.ClientError as exc:
+            # The server may drop the cache early (or it expired between our
+            # check and the call); recreate it, or fall back, and retry once.
+            if not cache_name or getattr(exc, "code", None) not in (403, 404):
+                raise
+            self._context_cache_name = None
+            return self._generate(prompt, self._get_context_cache())
+
     def analyze_fleet(self, fleet_snapshot: Dict[str, Any]) -> Dict[str, str]:
         """Ask Gemini to analyze the given fleet snapshot.
 
@@ -43,37 +298,103 @@ class GeminiEndpointAdvisor:
         - noncompliant_count
         - noncompliant_percentage
         """
-        pretty_snapshot = json.dumps(fleet_snapshot, indent=2, sort_keys=True)
+        prompt = _snapshot_prompt(fleet_snapshot)
 
-        base_prompt = f"""You are a senior endpoint engineer and security-conscious
-client platform owner. You are reviewing a Jamf Pro-managed macOS fleet.
+        cache_key = self._cache_key(prompt)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-You are given the following JSON describing fleet posture:
+        raw = self._call_gemini(prompt).strip()
+        return self._to_advice(raw, cache_key)
 
-```json
-{pretty_snapshot}
-```
+    def analyze_fleets(
+        self,
+        fleet_snapshots: List[Dict[str, Any]],
+        poll_interval: float = 30.0,
+    ) -> List[Dict[str, str]]:
+        """Analyze many fleet snapshots through one Gemini Batch API job.
 
-1. Write a concise plain-English summary (2–3 paragraphs) of the current fleet posture.
-2. Propose concrete remediation steps suitable for Jamf Pro:
-   - smart group logic ideas
-   - policy changes
-   - zero-touch / baseline improvements
-3. Generate a Slack-ready summary with bullets and emojis titled "Weekly Endpoint Posture Summary".
+        Batch jobs are billed at a discount and suit scheduled multi-tenant
+        reports, but finish asynchronously (minutes to hours); this method
+        blocks, polling every `poll_interval` seconds. Snapshots already in
+        the on-disk cache are answered from it and left out of the job.
 
-Return your answer in *valid JSON* with this structure:
+        Results are returned in the same order as `fleet_snapshots`.
+        """
+        prompts = [_snapshot_prompt(s) for s in fleet_snapshots]
+        cache_keys = [self._cache_key(p) for p in prompts]
+        results: List[Optional[Dict[str, str]]] = [
+            self._cache_get(k) for k in cache_keys
+        ]
 
-{{
-  "summary": "...",
-  "remediation_plan": "...",
-  "slack_message": "..."
-}}""".strip()
+        pending = {str(i): prompts[i] for i, r in enumerate(results) if r is None}
+        if pending:
+            raw_by_key = self._run_batch(pending, poll_interval)
+            for key in pending:
+                i = int(key)
+                raw = raw_by_key.get(key, "").strip()
+                results[i] = self._to_advice(raw, cache_keys[i])
+
+        return [r or {} for r in results]
+
+    def _run_batch(
+        self,
+        prompts: Dict[str, str],
+        poll_interval: float,
+    ) -> Dict[str, str]:
+        """Submit `{key: prompt}` as a batch job and return `{key: text}`.
+
+        Errors submitting or running the job propagate, like `_call_gemini`.
+        """
+        lines = []
+        for key, prompt in prompts.items():
+            request = {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "system_instruction": {"parts": [{"text": PROMPT_PREAMBLE}]},
+            }
+            lines.append(json.dumps({"key": key, "request": request}))
+
+        src = self.client.files.upload(
+            file=io.BytesIO("\n".join(lines).encode("utf-8")),
+            config={
+                "display_name": "gemini-endpoint-advisor-batch",
+                "mime_type": "jsonl",
+            },
+        )
+        job = self.client.batches.create(
+            model=self.model,
+            src=src.name,
+            config={"display_name": "gemini-endpoint-advisor-batch"},
+        )
+        while job.state.name not in _BATCH_DONE_STATES:
+            time.sleep(poll_interval)
+            job = self.client.batches.get(name=job.name)
+
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            raise RuntimeError(
+                f"Gemini batch job {job.name} ended in state {job.state.name}"
+            )
 
-        raw = self._call_gemini(base_prompt).strip()
+        content = self.client.files.download(file=job.dest.file_name)
+        texts: Dict[str, str] = {}
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = _loads(line)
+            if item.get("error"):
+                # Surface per-request failures as the summary text; like any
+                # non-JSON answer they are returned but not cached.
+                texts[item.get("key", "")] = f"Gemini request failed: {item['error']}"
+            else:
+                texts[item.get("key", "")] = _response_text(item.get("response") or {})
+        return texts
 
+    def _to_advice(self, raw: str, cache_key: str) -> Dict[str, str]:
+        """Turn Gemini's raw answer into the advice dict, caching it if valid."""
         try:
-            parsed = json.loads(raw)
-        except json.JSONDecodeError:
+            parsed = _loads_advice(raw)
+        except _DECODE_ERRORS:
             # As a safety net, if Gemini answered with Markdown or text,
             # wrap it into the expected structure instead of crashing.
             return {
@@ -82,8 +403,8 @@ Return your answer in *valid JSON* with this structure:
                 "slack_message": "",
             }
 
-        return {
-            "summary": str(parsed.get("summary", "")),
-            "remediation_plan": str(parsed.get("remediation_plan", "")),
-            "slack_message": str(parsed.get("slack_message", "")),
-        }
+        advice = {field: str(parsed.get(field, "")) for field in _ADVICE_FIELDS}
+        # Only well-formed answers are cached; a malformed one should be
+        # retried on the next run rather than replayed for a day.
+        self._cache_put(cache_key, advice)
+        return advice
@@ -3,17 +3,83 @@
 This module implements a minimal Jamf Pro API client using the modern
 bearer-token-based authentication flow (/api/v1/auth/token).
 
+The synchronous methods use `requests`. The `*_async` variants use `httpx`
+with HTTP/2 (optional `http2` extra) so every inventory page can be
+multiplexed over a single TLS connection.
+
 It is intentionally small and focused on the endpoints needed by the
 Gemini Endpoint Advisor CLI.
 """
 
 from __future__ import annotations
 
+import asyncio
+import math
 import os
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 import requests
 
+try:
+    import ijson  # type: ignore
+except ImportError:  # optional: falls back to resp.json()
+    ijson = None  # type: ignore[assignment]
+
+try:
+    import httpx  # type: ignore
+except ImportError:  # optional: only needed for the *_async methods
+    httpx = None  # type: ignore[assignment]
+
+
+T = TypeVar("T")
+
+# RSQL filter restricting inventory to devices under MDM management.
+MANAGED_ONLY_FILTER = "general.remoteManagement.managed==true"
+
+# (os_version, fileVaultEnabled, firewallEnabled) for a single computer.
+DevicePosture = Tuple[str, bool, bool]
+
+
+def device_posture(device: Dict[str, Any]) -> DevicePosture:
+    """Project a Jamf computer-inventory record onto the fields we aggregate."""
+    os_info = device.get("operatingSystem", {}) or {}
+    security = device.get("security", {}) or {}
+    return (
+        os_info.get("version", "unknown") or "unknown",
+        bool(security.get("fileVaultEnabled", False)),
+        bool(security.get("firewallEnabled", False)),
+    )
+
+
+def _stream_postures(raw: Any) -> Tuple[Optional[int], List[DevicePosture]]:
+    """Stream-parse an inventory page, keeping only the posture fields.
+
+    Walks ijson parse events so the rest of each record (general info,
+    storage, ...) is never materialized as Python dicts.
+    """
+    total: Optional[int] = None
+    postures: List[DevicePosture] = []
+    version, fv_enabled, fw_enabled = "unknown", False, False
+
+    for prefix, event, value in ijson.parse(raw):
+        if prefix == "results.item.operatingSystem.version":
+            version = value or "unknown"
+        elif prefix == "results.item.security.fileVaultEnabled":
+            fv_enabled = bool(value)
+        elif prefix == "results.item.security.firewallEnabled":
+            fw_enabled = bool(value)
+        elif prefix == "results.item":
+            if event == "start_map":
+                version, fv_enabled, fw_enabled = "unknown", False, False
+            elif event == "end_map":
+                postures.append((version, fv_enabled, fw_enabled))
+        elif prefix == "totalCount":
+            total = int(value)
+
+    return total, postures
+
 
 class JamfClient:
     """Simple Jamf Pro API client.
@@ -31,11 +97,13 @@ class JamfClient:
         client_id: Optional[str] = None,
         client_secret: Optional[str] = None,
         timeout: int = 60,
+        max_workers: int = 8,
     ) -> None:
         self.base_url = (base_url or os.environ.get("JAMF_BASE_URL", "")).rstrip("/")
         self.client_id = client_id or os.environ.get("JAMF_CLIENT_ID", "")
         self.client_secret = client_secret or os.environ.get("JAMF_CLIENT_SECRET", "")
         self.timeout = timeout
+        self.max_workers = max_workers
 
         if not self.base_url:
             raise ValueError("JAMF_BASE_URL is not set")
@@ -43,85 +111,320 @@ class JamfClient:
             raise ValueError("JAMF_CLIENT_ID and JAMF_CLIENT_SECRET must be set")
 
         self._token: Optional[str] = None
+        # Inventory pages are fetched from a thread pool; this serializes
+        # token fetches so a 401 on several pages refreshes only once.
+        self._token_lock = threading.Lock()
+
+        # One session for the client's lifetime so pagination reuses the same
+        # keep-alive HTTPS connection instead of a new TLS handshake per page.
+        self._session = requests.Session()
+        self._session.headers.update({"Accept": "application/json"})
 
     # ------------------------------------------------------------------ #
     # Auth
     # ------------------------------------------------------------------ #
-    def _get_token(self) -> str:
-        if self._token:
-            return self._token
+    def _get_token(self, stale: Optional[str] = None) -> str:
+        """Return the bearer token, fetching one if needed.
+
+        Pass the token that just got a 401 as `stale` to force a refresh;
+        if another thread already replaced it, the newer token is reused.
+        """
+        with self._token_lock:
+            if self._token and self._token != stale:
+                return self._token
 
-        url = f"{self.base_url}/api/v1/auth/token"
-        resp = requests.post(
+            url = f"{self.base_url}/api/v1/auth/token"
+            resp = self._session.post(
+                url,
+                auth=(self.client_id, self.client_secret),
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            token = data.get("token")
+            if not token:
+                raise RuntimeError("No token returned from Jamf auth endpoint")
+            self._token = token
+            return token
+
+    def _get(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        stream: bool = False,
+    ) -> requests.Response:
+        """GET with the session, re-authenticating once on a 401.
+
+        The bearer header is passed per request rather than stored on the
+        shared session, so concurrent page fetches never see it missing.
+        """
+        token = self._get_token()
+        resp = self._session.get(
             url,
-            auth=(self.client_id, self.client_secret),
+            params=params,
+            headers={"Authorization": f"Bearer {token}"},
             timeout=self.timeout,
+            stream=stream,
         )
-        resp.raise_for_status()
-        data = resp.json()
-        token = data.get("token")
-        if not token:
-            raise RuntimeError("No token returned from Jamf auth endpoint")
-        self._token = token
-        return token
-
-    def _headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self._get_token()}",
-            "Accept": "application/json",
-        }
+        if resp.status_code == 401:
+            # Token may be expired; refresh (once across threads) and retry.
+            resp.close()
+            token = self._get_token(stale=token)
+            resp = self._session.get(
+                url,
+                params=params,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=self.timeout,
+                stream=stream,
+            )
+        return resp
 
     # ------------------------------------------------------------------ #
     # Inventory
     # ------------------------------------------------------------------ #
+    @staticmethod
+    def _inventory_params(
+        page: int,
+        page_size: int,
+        managed_only: bool,
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
+            "page": page,
+            "page-size": page_size,
+            # Only request the sections we actually use; both requests and
+            # httpx encode the list as repeated `section=` params, which is
+            # what Jamf expects. GENERAL is left out since nothing reads it.
+            "section": ["SECURITY", "OPERATING_SYSTEM"],
+        }
+        if managed_only:
+            params["filter"] = MANAGED_ONLY_FILTER
+        return params
+
+    def _paginate(
+        self,
+        parse_page: Callable[[requests.Response], Tuple[Optional[int], List[T]]],
+        page_size: int,
+        max_devices: int,
+        managed_only: bool,
+        stream: bool = False,
+    ) -> List[T]:
+        """Page through /computers-inventory, returning parsed records.
+
+        The first page is fetched on its own to learn `totalCount`; the
+        remaining pages (up to `max_devices`) are then fetched concurrently
+        and stitched back together in page order.
+        """
+        url = f"{self.base_url}/api/v1/computers-inventory"
+
+        def fetch_page(page: int) -> Tuple[Optional[int], List[T]]:
+            params = self._inventory_params(page, page_size, managed_only)
+            resp = self._get(url, params, stream=stream)
+            try:
+                resp.raise_for_status()
+                return parse_page(resp)
+            finally:
+                resp.close()
+
+        if max_devices <= 0:
+            return []
+
+        total, results = fetch_page(0)
+        if not results:
+            return results
+
+        if total is None:
+            # Nothing to plan concurrent fetches from; page sequentially
+            # until a short page or `max_devices`.
+            page, batch = 1, results
+            while len(results) < max_devices and len(batch) >= page_size:
+                _, batch = fetch_page(page)
+                results.extend(batch)
+                page += 1
+            return results[:max_devices]
+
+        n_pages = math.ceil(min(total, max_devices) / page_size)
+
+        if n_pages > 1:
+            workers = max(1, min(self.max_workers, n_pages - 1))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # map() yields in submission order, so pages stay ordered.
+                for _, batch in pool.map(fetch_page, range(1, n_pages)):
+                    results.extend(batch)
+
+        return results[:max_devices]
+
     def get_computers_inventory(
         self,
         page_size: int = 50,
         max_devices: int = 200,
+        managed_only: bool = True,
     ) -> List[Dict[str, Any]]:
         """Fetch a subset of computers via Jamf Pro API /computers-inventory.
 
-        This method paginates until either `max_devices` is reached or there
-        are no more devices to fetch.
+        Records include the SECURITY and OPERATING_SYSTEM sections. With
+        `managed_only` (the default) unmanaged computers are filtered out
+        server-side.
         """
-        url = f"{self.base_url}/api/v1/computers-inventory"
-        page = 0
-        results: List[Dict[str, Any]] = []
-
-        while len(results) < max_devices:
-            params = {
-                "page": page,
-                "page-size": page_size,
-                # Only request the sections we actually use.
-                "section": "GENERAL,SECURITY,OPERATING_SYSTEM",
-            }
-            resp = requests.get(
-                url,
-                headers=self._headers(),
-                params=params,
-                timeout=self.timeout,
-            )
-            if resp.status_code == 401:
-                # Token may be expired; clear and retry once.
-                self._token = None
-                resp = requests.get(
-                    url,
-                    headers=self._headers(),
-                    params=params,
-                    timeout=self.timeout,
-                )
 
-            resp.raise_for_status()
+        def parse_page(
+            resp: requests.Response,
+        ) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+            data = resp.json()
+            return data.get("totalCount"), data.get("results", [])
+
+        return self._paginate(parse_page, page_size, max_devices, managed_only)
+
+    def get_device_postures(
+        self,
+        page_size: int = 50,
+        max_devices: int = 200,
+        managed_only: bool = True,
+    ) -> List[DevicePosture]:
+        """Fetch just the posture fields for a subset of computers.
+
+        Same pagination and `managed_only` filtering as
+        `get_computers_inventory`, but each device comes back as a
+        `DevicePosture` tuple. With `ijson` installed the response body is
+        stream-parsed straight off the socket; otherwise each page is decoded
+        with `resp.json()` and projected.
+        """
+
+        def parse_page(
+            resp: requests.Response,
+        ) -> Tuple[Optional[int], List[DevicePosture]]:
+            if ijson is not None:
+                # Let urllib3 undo any gzip/deflate before ijson reads it.
+                resp.raw.decode_content = True
+                return _stream_postures(resp.raw)
             data = resp.json()
             batch = data.get("results", [])
-            if not batch:
-                break
+            return data.get("totalCount"), [device_posture(d) for d in batch]
 
-            results.extend(batch)
-            if len(batch) < page_size:
-                # Last page
-                break
+        return self._paginate(
+            parse_page,
+            page_size,
+            max_devices,
+            managed_only,
+            stream=ijson is not None,
+        )
 
-            page += 1
+    # ------------------------------------------------------------------ #
+    # Inventory (async, HTTP/2)
+    # ------------------------------------------------------------------ #
+    async def _paginate_async(
+        self,
+        project: Callable[[List[Dict[str, Any]]], List[T]],
+        page_size: int,
+        max_devices: int,
+        managed_only: bool,
+    ) -> List[T]:
+        """Async counterpart of `_paginate` over one HTTP/2 connection.
+
+        After the first page, the remaining pages are requested together with
+        `asyncio.gather`, at most `max_workers` in flight at a time; HTTP/2
+        multiplexes them as concurrent streams on the same connection instead
+        of one socket per in-flight request.
+        """
+        if httpx is None:
+            raise RuntimeError(
+                "Async inventory requires httpx; "
+                "install with: pip install 'gemini-endpoint-advisor[http2]'"
+            )
+        if max_devices <= 0:
+            return []
+
+        url = f"{self.base_url}/api/v1/computers-inventory"
+        in_flight = asyncio.Semaphore(max(1, self.max_workers))
+        token_lock = asyncio.Lock()
+
+        async with httpx.AsyncClient(
+            http2=True,
+            timeout=self.timeout,
+            headers={"Accept": "application/json"},
+        ) as client:
+
+            async def get_token(stale: Optional[str] = None) -> str:
+                # Same contract as `_get_token`: only the first coroutine to
+                # see a 401 for `stale` fetches a new token.
+                async with token_lock:
+                    if self._token and self._token != stale:
+                        return self._token
+                    resp = await client.post(
+                        f"{self.base_url}/api/v1/auth/token",
+                        auth=(self.client_id, self.client_secret),
+                    )
+                    resp.raise_for_status()
+                    token = resp.json().get("token")
+                    if not token:
+                        raise RuntimeError("No token returned from Jamf auth endpoint")
+                    self._token = token
+                    return token
+
+            async def fetch_page(page: int) -> Tuple[Optional[int], List[T]]:
+                params = self._inventory_params(page, page_size, managed_only)
+                async with in_flight:
+                    token = await get_token()
+                    resp = await client.get(
+                        url,
+                        params=params,
+                        headers={"Authorization": f"Bearer {token}"},
+                    )
+                    if resp.status_code == 401:
+                        # Token may be expired; refresh (once) and retry.
+                        token = await get_token(stale=token)
+                        resp = await client.get(
+                            url,
+                            params=params,
+                            headers={"Authorization": f"Bearer {token}"},
+                        )
+                resp.raise_for_status()
+                data = resp.json()
+                return data.get("totalCount"), project(data.get("results", []))
+
+            total, results = await fetch_page(0)
+            if not results:
+                return results
+
+            if total is None:
+                # Nothing to plan concurrent fetches from; page sequentially
+                # until a short page or `max_devices`.
+                page, batch = 1, results
+                while len(results) < max_devices and len(batch) >= page_size:
+                    _, batch = await fetch_page(page)
+                    results.extend(batch)
+                    page += 1
+                return results[:max_devices]
+
+            n_pages = math.ceil(min(total, max_devices) / page_size)
+
+            # gather() returns results in argument order, so pages stay ordered.
+            pages = await asyncio.gather(*(fetch_page(p) for p in range(1, n_pages)))
+            for _, batch in pages:
+                results.extend(batch)
 
         return results[:max_devices]
+
+    async def get_computers_inventory_async(
+        self,
+        page_size: int = 50,
+        max_devices: int = 200,
+        managed_only: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Async, HTTP/2 version of `get_computers_inventory`."""
+        return await self._paginate_async(
+            lambda batch: batch, page_size, max_devices, managed_only
+        )
+
+    async def get_device_postures_async(
+        self,
+        page_size: int = 50,
+        max_devices: int = 200,
+        managed_only: bool = True,
+    ) -> List[DevicePosture]:
+        """Async, HTTP/2 version of `get_device_postures`."""
+        return await self._paginate_async(
+            lambda batch: [device_posture(d) for d in batch],
+            page_size,
+            max_devices,
+            managed_only,
+        )